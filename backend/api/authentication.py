@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_KEY = 'auth_token:{}'
+
+
+class TokenCache:
+    """
+    Ограниченный LRU-кэш токенов в памяти процесса: ключ токена -> токен
+    с загруженным пользователем. Записи живут TOKEN_CACHE_TIMEOUT секунд,
+    при переполнении вытесняются давно не использованные.
+
+    При TOKEN_CACHE_SHARED промахи сначала ищутся в общем кэше Django,
+    который видят все процессы. Сброс записи удаляет её из памяти текущего
+    процесса и из общего кэша, в остальных процессах она доживает
+    не дольше TOKEN_CACHE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                token, expires = entry
+                if expires > time.monotonic():
+                    self._tokens.move_to_end(key)
+                    return token
+                del self._tokens[key]
+        if not settings.TOKEN_CACHE_SHARED:
+            return None
+        token = cache.get(TOKEN_KEY.format(key))
+        if token is not None:
+            self._put(key, token)
+        return token
+
+    def _put(self, key, token):
+        with self._lock:
+            self._tokens[key] = (
+                token, time.monotonic() + settings.TOKEN_CACHE_TIMEOUT
+            )
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > settings.TOKEN_CACHE_SIZE:
+                self._tokens.popitem(last=False)
+
+    def set(self, key, token):
+        self._put(key, token)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(TOKEN_KEY.format(key), token,
+                      settings.TOKEN_SHARED_CACHE_TIMEOUT)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.delete(TOKEN_KEY.format(key))
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к authtoken_token и users_user
+    на каждый запрос: найденный токен с пользователем кладётся в token_cache.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        return token.user, token
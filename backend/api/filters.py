@@ -1,8 +1,10 @@
 from distutils.util import strtobool
 
 import django_filters
-from recipes.models import Favorite, Recipe, ShoppingCart
-from rest_framework import filters
+from django.db.models import Exists, OuterRef
+from recipes.models import Favorite, Recipe, ShoppingCart, TagRecipe
+from recipes.reference import get_tag_slugs
+from recipes.search import search_recipes
 
 CHOICES = (
     ('0', 'False'),
@@ -10,9 +12,30 @@ CHOICES = (
 )
 
 
+def get_tag_choices():
+    """
+    Допустимые slug тегов из кэша справочников, без запроса DISTINCT.
+    """
+    return [(slug, slug) for slug in get_tag_slugs()]
+
+
+def filter_exists(queryset, name, subquery):
+    """
+    Отбор рецептов условием EXISTS: без списка id в памяти,
+    без JOIN и повторяющихся строк. Если аннотация с таким именем
+    уже есть в запросе, используется она.
+    """
+    if name not in queryset.query.annotations:
+        queryset = queryset.annotate(**{name: Exists(subquery)})
+    return queryset.filter(**{name: True})
+
+
 class RecipeFilter(django_filters.FilterSet):
     author = django_filters.CharFilter(field_name='author__id')
-    tags = django_filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = django_filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags'
+    )
     is_favorited = django_filters.TypedChoiceFilter(
         choices=CHOICES,
         coerce=strtobool,
@@ -23,30 +46,41 @@ class RecipeFilter(django_filters.FilterSet):
         coerce=strtobool,
         method='get_is_in_shopping_cart'
     )
+    search = django_filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def filter_user_recipes(self, queryset, name, model):
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return filter_exists(queryset, name, model.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        ))
 
     def get_is_favorited(self, queryset, name, value):
         if not value:
             return queryset
-        favorites = Favorite.objects.filter(user=self.request.user)
-        return queryset.filter(
-            pk__in=(favorite.recipe.pk for favorite in favorites)
-        )
+        return self.filter_user_recipes(queryset, name, Favorite)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if not value:
             return queryset
-        try:
-            carts = ShoppingCart.objects.filter(user=self.request.user)
-        except ShoppingCart.DoesNotExist:
-            return queryset
-        return queryset.filter(
-            pk__in=(cart.recipe.pk for cart in carts)
-        )
+        return self.filter_user_recipes(queryset, name, ShoppingCart)
 
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        tag_slugs = get_tag_slugs()
+        return filter_exists(queryset, 'has_tags', TagRecipe.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[
+                tag_slugs[slug] for slug in value if slug in tag_slugs
+            ]
+        ))
 
-class IngredientFilter(filters.SearchFilter):
-    search_param = 'name'
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,259 @@
+import json
+import re
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import QueryDict
+from recipes.models import (Favorite, FeedItem, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, Tag, TagRecipe)
+from users.models import Subscribe, User
+
+from api.filters import RecipeFilter
+from api.pagination import RecipePagination
+from api.shopping_list import get_shopping_list
+from api.views import get_recipe_queryset
+
+PAGE_SIZE = 6
+BATCH_SIZE = 500
+
+# Справочники из нескольких строк читаются целиком быстрее, чем по индексу.
+SMALL_TABLES = {'recipes_tag'}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def walk_postgresql_plan(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from walk_postgresql_plan(child)
+
+
+def get_postgresql_problems(queryset, allow_sort):
+    plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+    problems = []
+    for node in walk_postgresql_plan(plan):
+        if (node['Node Type'] == 'Seq Scan'
+                and node['Relation Name'] not in SMALL_TABLES):
+            problems.append(f'Seq Scan по {node["Relation Name"]}')
+        if node['Node Type'] == 'Sort' and not allow_sort:
+            problems.append(f'Sort по {", ".join(node["Sort Key"])}')
+    return problems
+
+
+def get_sqlite_problems(queryset, allow_sort):
+    problems = []
+    for line in queryset.explain().splitlines():
+        detail = line.split(' ', 3)[-1]
+        scan = SQLITE_SCAN.match(detail)
+        if (scan and 'USING' not in detail
+                and scan.group(1) not in SMALL_TABLES):
+            problems.append(detail)
+        if detail == 'USE TEMP B-TREE FOR ORDER BY' and not allow_sort:
+            problems.append(detail)
+    return problems
+
+
+PLAN_CHECKS = {
+    'postgresql': get_postgresql_problems,
+    'sqlite': get_sqlite_problems,
+}
+
+
+class Command(BaseCommand):
+    help = ('Проверка планов горячих запросов API: команда завершается '
+            'ошибкой, если запрос читает таблицу целиком или сортирует '
+            'строки без индекса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Заполнить базу тестовыми данными на время проверки. '
+                 'Данные удаляются откатом транзакции.',
+        )
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+
+    def seed(self, users_count, recipes_count, ingredients_count):
+        prefix = f'seed{uuid.uuid4().hex[:8]}'
+        User.objects.bulk_create(
+            (User(email=f'{prefix}-{number}@example.com',
+                  username=f'{prefix}-{number}', first_name='seed',
+                  last_name='seed', password='!')
+             for number in range(users_count)),
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith=prefix
+        ).values_list('id', flat=True))
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=f'seed{number}', color=f'#{number:06X}',
+                    slug=f'seed{number}')
+                for number in range(3)
+            )
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=f'seed{number}', measurement_unit='г')
+             for number in range(ingredients_count)),
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        Recipe.objects.bulk_create(
+            (Recipe(author_id=user_ids[number % len(user_ids)],
+                    name=f'seed{number}', text='seed', image='seed.png',
+                    cooking_time=1)
+             for number in range(recipes_count)),
+            batch_size=BATCH_SIZE,
+        )
+        recipes = list(
+            Recipe.objects.values_list('id', 'author_id', 'pub_date')
+        )
+        authors_recipes = defaultdict(list)
+        for recipe_id, author_id, pub_date in recipes:
+            authors_recipes[author_id].append((recipe_id, pub_date))
+        IngredientInRecipe.objects.bulk_create(
+            (IngredientInRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_ids[(recipe_id + shift)
+                                             % len(ingredient_ids)],
+                amount=1)
+             for recipe_id, _, _ in recipes for shift in range(3)),
+            batch_size=BATCH_SIZE,
+        )
+        TagRecipe.objects.bulk_create(
+            (TagRecipe(recipe_id=recipe_id,
+                       tag_id=tag_ids[recipe_id % len(tag_ids)])
+             for recipe_id, _, _ in recipes),
+            batch_size=BATCH_SIZE,
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                (model(user_id=user_id, recipe_id=recipe_id)
+                 for number, user_id in enumerate(user_ids)
+                 for recipe_id, _, _ in recipes[number:number + 5]),
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+        Subscribe.objects.bulk_create(
+            (Subscribe(user_id=user_id,
+                       author_id=user_ids[(number + shift) % len(user_ids)])
+             for number, user_id in enumerate(user_ids)
+             for shift in range(1, 4)),
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        FeedItem.objects.bulk_create(
+            (FeedItem(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id, pub_date=pub_date)
+             for user_id, author_id in Subscribe.objects.filter(
+                 user_id__in=user_ids
+             ).values_list('user_id', 'author_id')
+             for recipe_id, pub_date in authors_recipes[author_id]),
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def get_recipe_filter(self, user, query):
+        return RecipeFilter(
+            QueryDict(query),
+            queryset=get_recipe_queryset(user),
+            request=SimpleNamespace(user=user),
+        ).qs.order_by(*RecipePagination.cursor_ordering)[:PAGE_SIZE]
+
+    def get_queries(self, user):
+        """
+        Горячие запросы API: (название, queryset, допустима ли сортировка).
+        """
+        latest = Recipe.objects.order_by('-pub_date', '-id').first()
+        pagination = RecipePagination()
+        cursor_filter = pagination.get_cursor_filter(
+            {'pub_date': latest.pub_date, 'id': latest.id}
+        )
+        page_ids = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)[:PAGE_SIZE])
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        queries = [
+            ('Список рецептов', get_recipe_queryset(
+                AnonymousUser()).order_by('-pub_date', '-id')[:PAGE_SIZE],
+             False),
+            ('Список рецептов с флагами пользователя', get_recipe_queryset(
+                user).order_by('-pub_date', '-id')[:PAGE_SIZE], False),
+            ('Страница рецептов по курсору', Recipe.objects.filter(
+                cursor_filter).order_by(*pagination.cursor_ordering)[
+                    :PAGE_SIZE + 1], False),
+            ('Рецепты автора', Recipe.objects.filter(author=user).order_by(
+                '-pub_date', '-id')[:PAGE_SIZE], False),
+            ('Фильтр по тегу', self.get_recipe_filter(
+                user, f'tags={tag.slug}'), False),
+            # Избранное и корзина одного пользователя невелики,
+            # их рецепты дешевле отсортировать, чем искать по всей ленте.
+            ('Фильтр избранного', self.get_recipe_filter(
+                user, 'is_favorited=1'), True),
+            ('Фильтр корзины', self.get_recipe_filter(
+                user, 'is_in_shopping_cart=1'), True),
+            ('Теги рецептов страницы', TagRecipe.objects.filter(
+                recipe_id__in=page_ids).select_related('tag'), False),
+            ('Продукты рецептов страницы', IngredientInRecipe.objects.filter(
+                recipe_id__in=page_ids).select_related('ingredient'), False),
+            ('Продукт по названию', Ingredient.objects.filter(
+                name=ingredient.name), False),
+            ('Подписки', Subscribe.objects.filter(user=user).select_related(
+                'author').order_by('-id')[:PAGE_SIZE], False),
+            ('Лента', FeedItem.objects.filter(user=user).order_by(
+                '-pub_date', '-recipe_id')[:PAGE_SIZE], False),
+            ('Избранное пользователя', Favorite.objects.filter(
+                user=user, recipe_id=latest.id), False),
+            ('Корзина пользователя', ShoppingCart.objects.filter(
+                user=user), False),
+            # Итог корзины сортируется по названию после группировки.
+            ('Список покупок', get_shopping_list(user), True),
+        ]
+        # LIKE в SQLite не учитывает регистр и не использует индекс,
+        # в PostgreSQL поиск по началу названия идёт по varchar_pattern_ops.
+        if connection.vendor == 'postgresql':
+            queries.append(('Продукты по началу названия',
+                            Ingredient.objects.filter(
+                                name__startswith=ingredient.name[:3]),
+                            False))
+        return queries
+
+    def handle(self, *args, **options):
+        check_plan = PLAN_CHECKS.get(connection.vendor)
+        if check_plan is None:
+            raise CommandError(
+                f'Проверка планов для {connection.vendor} не поддерживается.'
+            )
+        failed = []
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['users'], options['recipes'],
+                          options['ingredients'])
+            subscription = Subscribe.objects.select_related('user').first()
+            if subscription is None or not Recipe.objects.exists():
+                raise CommandError(
+                    'База пуста: заполните её или запустите команду '
+                    'с --seed.'
+                )
+            queries = self.get_queries(subscription.user)
+            for name, queryset, allow_sort in queries:
+                problems = check_plan(queryset, allow_sort)
+                if problems:
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: {"; ".join(problems)}'
+                    ))
+                else:
+                    self.stdout.write(f'{name}: OK')
+            transaction.set_rollback(options['seed'])
+        if failed:
+            raise CommandError(f'Запросы без индекса: {len(failed)}.')
+        self.stdout.write(self.style.SUCCESS(
+            'Все запросы используют индексы.'
+        ))
@@ -1,6 +1,125 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from foodgram.replicas import is_sticky, replicas_in_use, use_replicas
+from recipes.versions import get_user_version_name, get_versions
+
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.viewsets import GenericViewSet
 
 
 class ListRetriveViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
     pass
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка ETag и Last-Modified для list и retrieve.
+
+    Валидаторы строятся по версиям данных из version_names, без запросов
+    к базе и сериализации ответа. При user_versions = True учитывается
+    версия избранного, корзины и подписок текущего пользователя.
+
+    Счётчики избранного и подписчиков версий не меняют. При
+    stale_counters = True валидаторы сменяются не реже, чем раз
+    в COUNTERS_STALE_SECONDS, и счётчики отстают не дольше этого.
+
+    Пока версии моложе DB_REPLICA_STICKY_SECONDS, ответ с реплики может
+    быть собран из старых данных. Такой ответ отдаётся без валидаторов
+    и с Cache-Control: no-cache, иначе клиенты получали бы на него 304
+    до следующего изменения.
+    """
+    version_names = ()
+    user_versions = False
+    stale_counters = False
+
+    def get_version_names(self):
+        names = list(self.version_names)
+        user = self.request.user
+        if self.user_versions and user.is_authenticated:
+            names.append(get_user_version_name(user.id))
+        return names
+
+    def get_current_versions(self):
+        """
+        Версии данных ответа, прочитанные из кэша один раз за запрос.
+        """
+        if not hasattr(self, '_versions'):
+            self._versions = get_versions(*self.get_version_names())
+        return self._versions
+
+    def has_fresh_versions(self):
+        fresh_since = time.time() - settings.DB_REPLICA_STICKY_SECONDS
+        return any(
+            modified >= fresh_since
+            for _, modified in self.get_current_versions()
+        )
+
+    def get_validators(self, request):
+        versions = list(self.get_current_versions())
+        if self.stale_counters:
+            period = settings.COUNTERS_STALE_SECONDS
+            started = time.time() // period * period
+            versions.append((str(started), started))
+        digest = hashlib.sha1()
+        for part in (
+            *(token for token, _ in versions),
+            str(request.user.id),
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        ):
+            digest.update(part.encode())
+        last_modified = int(max(modified for _, modified in versions))
+        return quote_etag(digest.hexdigest()), last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        if replicas_in_use() and self.has_fresh_versions():
+            response = handler(request, *args, **kwargs)
+            response['Cache-Control'] = 'no-cache'
+            return response
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            if self.user_versions:
+                patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы читают с реплик. Аутентификация выполняется
+    до переключения, по основной базе: только что выданный токен
+    может ещё не дойти до реплики.
+    """
+
+    def can_use_replicas(self, request):
+        return (
+            request.method in SAFE_METHODS and not is_sticky(request.user)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.can_use_replicas(request):
+            use_replicas(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            use_replicas(False)
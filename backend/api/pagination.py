@@ -1,12 +1,141 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     """
     Пагинатор проекта.
+
+    Если у наследника задан cursor_ordering, передача параметра cursor
+    (в том числе пустого) включает пагинацию по ключу: следующая страница
+    выбирается условием по полям cursor_ordering, без COUNT и OFFSET.
+    Параметры из cursor_incompatible_params задают свой порядок
+    выдачи, поэтому вместе с cursor не принимаются.
     """
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_ordering = None
+    cursor_incompatible_params = ()
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_ordering is not None
+            and self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        for param in self.cursor_incompatible_params:
+            if request.query_params.get(param):
+                raise ParseError(
+                    f'Параметр {self.cursor_query_param} нельзя '
+                    f'использовать вместе с {param}.'
+                )
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_cursor_filter(position))
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ]))
+
+    def get_cursor_fields(self):
+        return [field.lstrip('-') for field in self.cursor_ordering]
+
+    def get_cursor_filter(self, position):
+        """
+        Условие «строго после позиции» для составного ключа.
+        """
+        conditions = []
+        for index, ordering in enumerate(self.cursor_ordering):
+            field = ordering.lstrip('-')
+            lookup = 'lt' if ordering.startswith('-') else 'gt'
+            condition = {
+                name: position[name]
+                for name in self.get_cursor_fields()[:index]
+            }
+            condition[f'{field}__{lookup}'] = position[field]
+            conditions.append(Q(**condition))
+        return reduce(or_, conditions)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        fields = self.get_cursor_fields()
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return {
+                name: model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, values)
+            }
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        values = [
+            getattr(instance, name) for name in self.get_cursor_fields()
+        ]
+        return urlsafe_b64encode(
+            json.dumps(values, default=str).encode()
+        ).decode()
+
+    def get_next_cursor_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+
+class RecipePagination(CustomPagination):
+    """
+    Пагинатор рецептов: курсор по (pub_date, id). Поиск сортирует
+    рецепты по релевантности и работает только с номерами страниц.
+    """
+    cursor_ordering = ('-pub_date', '-id')
+    cursor_incompatible_params = ('search',)
+
+
+class SubscribePagination(CustomPagination):
+    """
+    Пагинатор подписок: курсор по id подписки.
+    """
+    cursor_ordering = ('-id',)
+
+
+class FeedPagination(CustomPagination):
+    """
+    Пагинатор ленты: курсор по (pub_date, recipe_id) записи ленты.
+    """
+    cursor_ordering = ('-pub_date', '-recipe_id')
 
 
 class RecipesLimitPagination(PageNumberPagination):
@@ -1,7 +1,15 @@
+from collections import OrderedDict
+
 from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 
+from recipes.images import (IMAGE_FIELDS, check_image_data, get_variant_names,
+                            schedule_image_processing)
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                             ShoppingCart, Tag, TagRecipe)
+from recipes.versions import RECIPES, bump_versions
 from rest_framework import serializers
 from users.models import Subscribe, User
 
@@ -9,39 +17,38 @@ from users.models import Subscribe, User
 class Base64ImageField(serializers.ImageField):
     """
     Класс обработки image.
+
+    Строка base64 целиком не декодируется в запросе: проверяются только
+    её длина и заголовок картинки, а сама она обрабатывается в фоне,
+    см. recipes.images.
     """
 
     def to_internal_value(self, data):
-        import base64
-        import uuid
-
-        from django.core.files.base import ContentFile
-
-        import six
-
-        if isinstance(data, six.string_types):
-            if 'data:' in data and ';base64,' in data:
-                header, data = data.split(';base64,')
-
-            try:
-                decoded_file = base64.b64decode(data)
-            except TypeError:
+        if isinstance(data, str):
+            if data.startswith('data:') and not data.startswith(
+                    'data:image/'):
                 self.fail('invalid_image')
+            try:
+                check_image_data(data)
+            except ValueError as error:
+                raise serializers.ValidationError(str(error))
+            return data
+        return super().to_internal_value(data)
 
-            file_name = str(uuid.uuid4())[:12]
-            file_extension = self.get_file_extension(file_name, decoded_file)
-            complete_file_name = "%s.%s" % (file_name, file_extension, )
-            data = ContentFile(decoded_file, name=complete_file_name)
-
-        return super(Base64ImageField, self).to_internal_value(data)
-
-    def get_file_extension(self, file_name, decoded_file):
-        import imghdr
-
-        extension = imghdr.what(file_name, decoded_file)
-        extension = "jpg" if extension == "jpeg" else extension
 
-        return extension
+def get_subscriptions(context):
+    """
+    Множество id авторов, на которых подписан пользователь запроса.
+    Загружается одним запросом и хранится в контексте сериализатора,
+    общем для всех вложенных сериализаторов.
+    """
+    if 'subscriptions' not in context:
+        context['subscriptions'] = set(
+            Subscribe.objects.filter(
+                user=context['request'].user
+            ).values_list('author_id', flat=True)
+        )
+    return context['subscriptions']
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -53,7 +60,8 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'password',
-                  'first_name', 'last_name', 'is_subscribed')
+                  'first_name', 'last_name', 'is_subscribed',
+                  'recipes_count', 'followers_count')
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
@@ -68,13 +76,7 @@ class UserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        return(
-            Subscribe.objects.filter(
-                user=request.user,
-                author__id=obj.id
-            ).exists()
-            and request.user.is_authenticated
-        )
+        return obj.id in get_subscriptions(self.context)
 
 
 class ShoppingCartFavoriteRecipes(metaclass=serializers.SerializerMetaclass):
@@ -88,55 +90,69 @@ class ShoppingCartFavoriteRecipes(metaclass=serializers.SerializerMetaclass):
     def get_is_favorited(self, obj):
         """
         Функция обработки параметра избранного.
+        Значение берётся из аннотации queryset, если она есть.
         """
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        return (
-            Favorite.objects.filter(user=request.user,
-                                    recipe__id=obj.id).exists()
-            and request.user.is_authenticated
-        )
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
+        return Favorite.objects.filter(user=request.user,
+                                       recipe__id=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        """
+        Функция обработки параметра корзины.
+        """
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        return (
-            ShoppingCart.objects.filter(user=request.user,
-                                        recipe__id=obj.id).exists()
-            and request.user.is_authenticated
-        )
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
+        return ShoppingCart.objects.filter(user=request.user,
+                                           recipe__id=obj.id).exists()
 
     def validate_ingredients(self, value):
-        ingredients_list = []
-        ingredients = value
-        for ingredient in ingredients:
+        """
+        Проверка продуктов: повторы ищутся в памяти,
+        наличие в базе проверяется одним запросом.
+        """
+        ingredient_ids = []
+        for ingredient in value:
             if ingredient['amount'] < 1:
                 raise serializers.ValidationError(
                     'Количество должно быть равным или больше 1!')
-            check_id = ingredient['ingredient']['id']
-            check_ingredient = Ingredient.objects.filter(id=check_id)
-            if not check_ingredient.exists():
-                raise serializers.ValidationError(
-                    'Ингредиента нет в базе!')
-            if check_ingredient in ingredients_list:
-                raise serializers.ValidationError(
-                    'Продукты не должны повторяться!')
-            ingredients_list.append(check_ingredient)
+            ingredient_ids.append(ingredient['ingredient']['id'])
+        unique_ids = set(ingredient_ids)
+        if len(unique_ids) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Продукты не должны повторяться!')
+        if Ingredient.objects.filter(id__in=unique_ids).count() != len(
+                unique_ids):
+            raise serializers.ValidationError(
+                'Ингредиента нет в базе!')
         return value
 
 
-class RecipesCount(metaclass=serializers.SerializerMetaclass):
+class ImageVariants(metaclass=serializers.SerializerMetaclass):
     """
-    Класс определения количества рецептов автора.
+    Класс получения ссылок на уменьшенные копии картинки рецепта.
     """
+    image_variants = serializers.SerializerMethodField()
 
-    def get_recipes_count(self, obj):
-        """
-        Функция подсчёта количества рецептов автора.
-        """
-        return Recipe.objects.filter(author=obj.author).count()
+    def get_image_variants(self, obj):
+        if not obj.image or obj.image_status != Recipe.IMAGE_READY:
+            return {}
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in get_variant_names(obj.image.name).items():
+            url = obj.image.storage.url(name)
+            urls[variant] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return urls
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -182,9 +198,18 @@ class IngredientInRecipeShortSerializer(serializers.ModelSerializer):
         model = IngredientInRecipe
         fields = ('id', 'amount')
 
+    def to_representation(self, instance):
+        """
+        id продукта берётся из внешнего ключа без загрузки продукта.
+        """
+        return OrderedDict((
+            ('id', instance.ingredient_id),
+            ('amount', instance.amount),
+        ))
+
 
 class RecipeSerializer(serializers.ModelSerializer,
-                       ShoppingCartFavoriteRecipes):
+                       ShoppingCartFavoriteRecipes, ImageVariants):
     """
     Сериализатор модели рецептов. Чтение.
     """
@@ -198,17 +223,61 @@ class RecipeSerializer(serializers.ModelSerializer,
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'name', 'ingredients', 'text',
-                  'cooking_time', 'pub_date', 'image', 'tags',
-                  'is_favorited', 'is_in_shopping_cart')
+                  'cooking_time', 'pub_date', 'image', 'image_status',
+                  'image_variants', 'tags', 'is_favorited',
+                  'is_in_shopping_cart', 'favorites_count')
+
+
+class FeedItemSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор записи ленты: выводится рецепт целиком.
+    """
 
+    def to_representation(self, instance):
+        return RecipeSerializer(instance.recipe, context=self.context).data
 
-class RecipeShortFieldSerializer(serializers.ModelSerializer):
+
+class RecipeShortFieldSerializer(serializers.ModelSerializer,
+                                 ImageVariants):
     """
     Сериализатор короткой версии отображения модели рецептов.
     """
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_variants')
+
+
+class TagsRelatedField(serializers.ManyRelatedField):
+    """
+    Список тегов: все id проверяются одним запросом.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        tag_ids = []
+        for pk in data:
+            if isinstance(pk, bool) or not str(pk).isdigit():
+                self.child_relation.fail('incorrect_type',
+                                         data_type=type(pk).__name__)
+            tag_ids.append(int(pk))
+        tag_ids = list(dict.fromkeys(tag_ids))
+        tags = self.child_relation.get_queryset().in_bulk(tag_ids)
+        for pk in tag_ids:
+            if pk not in tags:
+                self.child_relation.fail('does_not_exist', pk_value=pk)
+        return [tags[pk] for pk in tag_ids]
+
+
+class TagsPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['child_relation'] = cls(
+            queryset=kwargs.pop('queryset')
+        )
+        return TagsRelatedField(*args, **kwargs)
 
 
 class RecipeSerializerPost(serializers.ModelSerializer,
@@ -217,8 +286,7 @@ class RecipeSerializerPost(serializers.ModelSerializer,
     Сериализатор модели рецептов. Запись.
     """
     author = UserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = TagsPrimaryKeyField(queryset=Tag.objects.all(), many=True)
     ingredients = IngredientInRecipeShortSerializer(source='recipe_ingredient',
                                                     many=True)
     image = Base64ImageField(max_length=None, use_url=False,)
@@ -227,64 +295,209 @@ class RecipeSerializerPost(serializers.ModelSerializer,
 
     class Meta:
         model = Recipe
-        fields = ('id', 'author', 'name', 'image', 'text',
+        fields = ('id', 'author', 'name', 'image', 'image_status', 'text',
                   'ingredients', 'is_in_shopping_cart', 'tags',
-                  'cooking_time', 'is_favorited')
+                  'cooking_time', 'is_favorited', 'favorites_count')
+        read_only_fields = ('image_status',)
 
     def add_ingredients_and_tags(self, tags, ingredients, recipe):
         """
         Функция добавления тегов и продуктов в рецепт.
         """
-        for tag in tags:
-            recipe.tags.add(tag)
-            recipe.save()
-        for ingredient in ingredients:
-            if not IngredientInRecipe.objects.filter(
-                    ingredient_id=ingredient['ingredient']['id'],
-                    recipe=recipe).exists():
-                ingredientinrecipe = IngredientInRecipe.objects.create(
-                    ingredient_id=ingredient['ingredient']['id'],
-                    recipe=recipe)
-                ingredientinrecipe.amount = ingredient['amount']
-                ingredientinrecipe.save()
-            else:
-                IngredientInRecipe.objects.filter(recipe=recipe).delete()
-                recipe.delete()
-                raise serializers.ValidationError(
-                    'Продукты не могут повторяться в рецепте!')
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=tag) for tag in tags
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient['ingredient']['id'],
+                amount=ingredient['amount'],
+            )
+            for ingredient in ingredients
+        )
         return recipe
 
+    def set_image(self, recipe, image):
+        """
+        Строка base64 декодируется в фоне, для загруженного файла
+        в фоне создаются уменьшенные копии.
+        """
+        if isinstance(image, str):
+            schedule_image_processing(recipe, image)
+        else:
+            recipe.image = image
+            schedule_image_processing(recipe)
+
+    @transaction.atomic
     def create(self, validated_data):
         """
         Функция создания рецепта.
         """
-        author = validated_data.get('author')
         tags = validated_data.pop('tags')
-        name = validated_data.get('name')
-        image = validated_data.get('image')
-        text = validated_data.get('text')
-        cooking_time = validated_data.get('cooking_time')
         ingredients = validated_data.pop('recipe_ingredient')
-        recipe = Recipe.objects.create(author=author, name=name,
-                                       image=image, text=text,
-                                       cooking_time=cooking_time,)
-        recipe = self.add_ingredients_and_tags(tags, ingredients, recipe)
-        return recipe
+        image = validated_data.pop('image')
+        recipe = Recipe(**validated_data)
+        self.set_image(recipe, image)
+        recipe.save()
+        return self.add_ingredients_and_tags(tags, ingredients, recipe)
+
+    def update_tags(self, recipe, tags):
+        """
+        Функция изменения тегов рецепта: удаляются и добавляются
+        только отличающиеся теги.
+        """
+        current_ids = {tag.id for tag in recipe.tags.all()}
+        new_ids = {tag.id for tag in tags}
+        if current_ids - new_ids:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=current_ids - new_ids
+            ).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - current_ids
+        )
+
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Функция изменения продуктов рецепта: удаляются, добавляются
+        и обновляются только отличающиеся строки.
+        """
+        current = {
+            ingredient.ingredient_id: ingredient
+            for ingredient in recipe.recipe_ingredient.all()
+        }
+        new = {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed_ids = [
+            ingredient.id for ingredient_id, ingredient in current.items()
+            if ingredient_id not in new
+        ]
+        if removed_ids:
+            IngredientInRecipe.objects.filter(id__in=removed_ids).delete()
+        changed = []
+        for ingredient_id, amount in new.items():
+            ingredient = current.get(ingredient_id)
+            if ingredient is not None and ingredient.amount != amount:
+                ingredient.amount = amount
+                changed.append(ingredient)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        )
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Функция редактирования рецепта.
+        Теги и продукты меняются, только если переданы в запросе.
+        Сохраняются только переданные поля, чтобы не затереть
+        результат фоновой обработки картинки.
         """
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('recipe_ingredient')
-        TagRecipe.objects.filter(recipe=instance).delete()
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        instance = self.add_ingredients_and_tags(tags, ingredients, instance)
-        super().update(instance, validated_data)
-        instance.save()
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('recipe_ingredient', None)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        image = validated_data.pop('image', None)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        update_fields = list(validated_data)
+        if image is not None:
+            self.set_image(instance, image)
+            update_fields += IMAGE_FIELDS
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=update_fields)
+        # Массовые операции с тегами и продуктами не вызывают сигналов.
+        bump_versions(RECIPES)
         return instance
 
 
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор загрузки картинки рецепта файлом.
+    """
+    image = serializers.ImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('image', 'image_status')
+        read_only_fields = ('image_status',)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        instance.image = validated_data['image']
+        schedule_image_processing(instance)
+        instance.save(update_fields=IMAGE_FIELDS)
+        return instance
+
+
+def get_recipes_limit(request):
+    """
+    Значение параметра recipes_limit или None, если он не задан.
+    """
+    if request is None:
+        return None
+    recipes_limit = request.query_params.get('recipes_limit', '')
+    if not recipes_limit.isdigit():
+        return None
+    return int(recipes_limit)
+
+
+def get_authors_recipes(author_ids, recipes_limit=None):
+    """
+    Последние рецепты авторов одним запросом.
+
+    Рецепты нумеруются оконной функцией ROW_NUMBER() внутри каждого
+    автора, поэтому ограничение recipes_limit применяется к каждому
+    автору отдельно. Возвращает словарь {id автора: [рецепты]}.
+    """
+    if not author_ids:
+        # Пустой IN не компилируется в SQL для запроса raw.
+        return {}
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if recipes_limit is not None:
+        ranked = recipes.order_by().annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE ranked.recipe_rank <= %s '
+            f'ORDER BY ranked.pub_date DESC, ranked.id DESC',
+            (*params, recipes_limit)
+        )
+    authors_recipes = {}
+    for recipe in recipes:
+        authors_recipes.setdefault(recipe.author_id, []).append(recipe)
+    return authors_recipes
+
+
+class SubscribeListSerializer(serializers.ListSerializer):
+    """
+    Список подписок: рецепты всех авторов страницы
+    загружаются одним запросом.
+    """
+
+    def to_representation(self, data):
+        subscriptions = list(data)
+        self.context['authors_recipes'] = get_authors_recipes(
+            [subscription.author_id for subscription in subscriptions],
+            get_recipes_limit(self.context.get('request'))
+        )
+        return super().to_representation(subscriptions)
+
+
 class SubscribeSerializer(serializers.ModelSerializer):
     """
     Сериализатор списка подписок.
@@ -296,15 +509,17 @@ class SubscribeSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipe_author.count',
-        read_only=True
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
+    followers_count = serializers.ReadOnlyField(
+        source='author.followers_count'
     )
 
     class Meta:
         model = Subscribe
         fields = ('id', 'username', 'email', 'is_subscribed',
-                  'first_name', 'last_name', 'recipes', 'recipes_count')
+                  'first_name', 'last_name', 'recipes', 'recipes_count',
+                  'followers_count')
+        list_serializer_class = SubscribeListSerializer
 
     def get_is_subscribed(self, obj):
         """
@@ -313,26 +528,22 @@ class SubscribeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request:
             return True
-        return(
-            Subscribe.objects.filter(
-                user=request.user,
-                author__id=obj.id
-            ).exists()
-            and request.user.is_authenticated
-        )
+        if request.user.is_anonymous:
+            return False
+        return obj.author_id in get_subscriptions(self.context)
 
     def get_recipes(self, obj):
         """
         Функция получения рецептов
         автора.
         """
-        try:
-            recipes_limit = int(
-                self.context.get('request').query_params['recipes_limit']
+        authors_recipes = self.context.get('authors_recipes')
+        if authors_recipes is None:
+            authors_recipes = get_authors_recipes(
+                [obj.author_id],
+                get_recipes_limit(self.context.get('request'))
             )
-            recipes = Recipe.objects.filter(author=obj.author)[:recipes_limit]
-        except Exception:
-            recipes = Recipe.objects.filter(author=obj.author)
+        recipes = authors_recipes.get(obj.author_id, [])
         serializer = RecipeShortFieldSerializer(recipes, many=True,)
         return serializer.data
 
@@ -0,0 +1,155 @@
+import csv
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from recipes.models import IngredientInRecipe
+
+CHUNK_SIZE = 8192
+
+logger = logging.getLogger(__name__)
+
+
+def get_shopping_list(user):
+    """
+    Итоговый список покупок пользователя.
+
+    Суммирует количество продуктов по всем рецептам из корзины
+    одним агрегирующим запросом. Группировка идёт по id продукта
+    и единице измерения, поэтому одноимённые продукты с разными
+    единицами измерения остаются отдельными строками.
+    """
+    return (
+        IngredientInRecipe.objects
+        .filter(recipe__carts__user=user)
+        .values(
+            'ingredient__id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+        )
+        .annotate(amount=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def get_cart_hash(items):
+    """
+    Хэш содержимого корзины.
+
+    Меняется при любом изменении итоговых количеств,
+    в том числе при редактировании рецептов из корзины,
+    а также при переименовании продуктов.
+    """
+    digest = hashlib.sha256()
+    for item in items:
+        # repr кортежа однозначен, даже если в названии есть разделители.
+        digest.update(repr((
+            item['ingredient__id'],
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['amount'],
+        )).encode())
+    return digest.hexdigest()
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает строку вместо записи.
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_txt(items):
+    for item in items:
+        yield (
+            f'{item["ingredient__name"]} -- {item["amount"]} '
+            f'{item["ingredient__measurement_unit"]}\n'
+        ).encode()
+
+
+def render_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(
+        ('Продукт', 'Количество', 'Единицы измерения')
+    ).encode()
+    for item in items:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['amount'],
+            item['ingredient__measurement_unit'],
+        )).encode()
+
+
+def get_pdf_font():
+    """
+    Регистрирует шрифт с кириллицей, если он указан в настройках.
+    Без него кириллица в PDF не отображается.
+    """
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if not font_path or not os.path.exists(font_path):
+        logger.error(
+            'Шрифт SHOPPING_LIST_PDF_FONT не найден: %r, кириллица '
+            'в PDF не будет отображаться', font_path
+        )
+        return 'Helvetica'
+    if 'ShoppingList' not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont('ShoppingList', font_path))
+    return 'ShoppingList'
+
+
+def render_pdf(items):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    font = get_pdf_font()
+    width, height = A4
+    top = height - 50
+    pdf.setFont(font, 16)
+    pdf.drawString(50, top, 'Список покупок')
+    y = top - 30
+    pdf.setFont(font, 12)
+    for item in items:
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = top
+        pdf.drawString(
+            50, y,
+            f'{item["ingredient__name"]} -- {item["amount"]} '
+            f'{item["ingredient__measurement_unit"]}'
+        )
+        y -= 20
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+EXPORT_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+
+
+def cache_stream(chunks, cache_key):
+    """
+    Отдаёт части файла и сохраняет собранный файл в кэш.
+    """
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(cache_key, b''.join(body),
+              settings.SHOPPING_LIST_CACHE_TIMEOUT)
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import User
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def reset_deleted_token(instance, **kwargs):
+    """
+    Выход через djoser и удаление токена: токен сразу перестаёт
+    приниматься из кэша.
+    """
+    token_cache.invalidate(instance.key)
+    # Повторно после фиксации: параллельный запрос мог успеть
+    # вернуть токен в кэш, пока транзакция не завершилась.
+    transaction.on_commit(lambda: token_cache.invalidate(instance.key))
+
+
+@receiver(post_save, sender=User)
+def reset_user_tokens(instance, update_fields=None, **kwargs):
+    """
+    Смена пароля и другие изменения пользователя: кэш токена
+    хранит копию пользователя, поэтому она сбрасывается.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    keys = list(Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ))
+
+    def invalidate():
+        for key in keys:
+            token_cache.invalidate(key)
+
+    invalidate()
+    transaction.on_commit(invalidate)
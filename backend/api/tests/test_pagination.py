@@ -0,0 +1,25 @@
+from django.core.cache import cache, caches
+from rest_framework.test import APITestCase
+
+URL = '/api/recipes/'
+
+
+class RecipeCursorPaginationTest(APITestCase):
+    """
+    Пагинация рецептов по курсору.
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+
+    def test_cursor(self):
+        response = self.client.get(URL, {'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+
+    def test_cursor_with_search(self):
+        response = self.client.get(URL, {'cursor': '', 'search': 'суп'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(URL, {'search': 'суп'})
+        self.assertEqual(response.status_code, 200)
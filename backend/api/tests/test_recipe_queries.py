@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag, TagRecipe)
+from rest_framework.test import APITestCase
+from users.models import Subscribe, User
+
+RECIPES_COUNT = 25
+
+
+class RecipeQueryBudgetTest(APITestCase):
+    """
+    Число запросов при чтении рецептов не зависит от размера страницы.
+    """
+    # Число рецептов, рецепты с авторами, теги, продукты.
+    LIST_QUERIES = 4
+    # Рецепт с автором, теги, продукты.
+    RETRIEVE_QUERIES = 3
+    # Подписки пользователя для is_subscribed автора.
+    SUBSCRIPTIONS_QUERIES = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='reader', last_name='reader', password='password'
+        )
+        authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='author',
+                last_name='author', password='password'
+            )
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=f'tag{number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'ingredient{number}',
+                                      measurement_unit='г')
+            for number in range(5)
+        ]
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)], name=f'recipe{number}',
+                text='text', image='recipe.png', cooking_time=1
+            )
+            TagRecipe.objects.bulk_create(
+                TagRecipe(recipe=recipe, tag=tag) for tag in tags[:2]
+            )
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=1)
+                for ingredient in ingredients[:3]
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        # Версии данных и справочники не должны приходить из кэша
+        # предыдущего теста.
+        cache.clear()
+
+    def assert_list_queries(self, page_size, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'/api/recipes/?limit={page_size}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+
+    def test_list_anonymous(self):
+        for page_size in (6, 20):
+            with self.subTest(page_size=page_size):
+                self.assert_list_queries(page_size, self.LIST_QUERIES)
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        for page_size in (6, 20):
+            with self.subTest(page_size=page_size):
+                self.assert_list_queries(
+                    page_size,
+                    self.LIST_QUERIES + self.SUBSCRIPTIONS_QUERIES
+                )
+
+    def test_retrieve_anonymous(self):
+        with self.assertNumQueries(self.RETRIEVE_QUERIES):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_authenticated(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(
+            self.RETRIEVE_QUERIES + self.SUBSCRIPTIONS_QUERIES
+        ):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,45 @@
+from django.core.cache import cache, caches
+from recipes.models import Ingredient, Recipe, ShoppingCart
+from rest_framework.test import APITestCase
+from users.models import User
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class DownloadShoppingCartTest(APITestCase):
+    """
+    Условная выгрузка списка покупок по ETag.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='buyer@example.com', username='buyer',
+            first_name='buyer', last_name='buyer', password='password'
+        )
+        recipe = Recipe.objects.create(
+            author=cls.user, name='recipe', text='text',
+            image='recipe.png', cooking_time=1
+        )
+        recipe.recipe_ingredient.create(
+            amount=2,
+            ingredient=Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            )
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+        self.client.force_authenticate(self.user)
+
+    def test_if_none_match(self):
+        etag = self.client.get(URL)['ETag']
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(header=header):
+                response = self.client.get(URL, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+        response = self.client.get(URL, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
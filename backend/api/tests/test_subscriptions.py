@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from recipes.models import Recipe
+from rest_framework.test import APITestCase
+from users.models import Subscribe, User
+
+RECIPES_PER_AUTHOR = 5
+
+
+class SubscriptionsRecipesLimitTest(APITestCase):
+    """
+    Рецепты авторов в списке подписок с параметром recipes_limit.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='reader', last_name='reader', password='password'
+        )
+        cls.lonely = User.objects.create_user(
+            email='lonely@example.com', username='lonely',
+            first_name='lonely', last_name='lonely', password='password'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='author',
+                last_name='author', password='password'
+            )
+            for number in range(2)
+        ]
+        for author in cls.authors:
+            for number in range(RECIPES_PER_AUTHOR):
+                Recipe.objects.create(
+                    author=author, name=f'recipe{number}', text='text',
+                    image='recipe.png', cooking_time=1
+                )
+            Subscribe.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_empty_page(self):
+        self.client.force_authenticate(self.lonely)
+        response = self.client.get(
+            '/api/users/subscriptions/?page=1&limit=6&recipes_limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_limited_page(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(
+            '/api/users/subscriptions/?page=1&limit=6&recipes_limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), len(self.authors))
+        for subscription in response.data['results']:
+            expected = list(
+                Recipe.objects.filter(author_id=subscription['id'])
+                .order_by('-pub_date', '-id')
+                .values_list('id', flat=True)[:3]
+            )
+            self.assertEqual(
+                [recipe['id'] for recipe in subscription['recipes']],
+                expected
+            )
+            self.assertEqual(
+                subscription['recipes_count'], RECIPES_PER_AUTHOR
+            )
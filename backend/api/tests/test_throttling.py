@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from api.throttling import TokenBucketThrottle
+
+
+class Clock:
+    """
+    Часы для throttle и для сроков жизни ключей в locmem-кэше.
+    """
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestThrottle(TokenBucketThrottle):
+    scope = 'test'
+    rate = '60/min'
+
+
+class TokenBucketThrottleTest(SimpleTestCase):
+    """
+    Ёмкость, пополнение корзины и Retry-After при подменённых часах.
+    """
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.clock = Clock()
+        patcher = mock.patch('time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = SimpleNamespace(
+            user=None, META={'REMOTE_ADDR': '10.0.0.1'}
+        )
+
+    def hit(self):
+        throttle = TestThrottle()
+        throttle.timer = self.clock
+        return throttle.allow_request(self.request, None), throttle
+
+    def test_burst_and_retry_after(self):
+        for _ in range(60):
+            self.assertTrue(self.hit()[0])
+        allowed, throttle = self.hit()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 1)
+        self.clock.now += 0.5
+        allowed, throttle = self.hit()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 0.5)
+        self.clock.now += 0.5
+        self.assertTrue(self.hit()[0])
+        self.assertFalse(self.hit()[0])
+
+    def test_refill_after_idle(self):
+        for _ in range(60):
+            self.hit()
+        self.clock.now += 30
+        for _ in range(30):
+            self.assertTrue(self.hit()[0])
+        self.assertFalse(self.hit()[0])
+        self.clock.now += 3600
+        for _ in range(60):
+            self.assertTrue(self.hit()[0])
+        self.assertFalse(self.hit()[0])
+
+    def test_saturation_keeps_limit(self):
+        allowed = 0
+        for _ in range(1200):
+            allowed += self.hit()[0]
+            self.clock.now += 0.25
+        # 60 жетонов сразу и по одному в секунду: последний запрос
+        # приходит на 299.75 секунде, когда пополнилось 299 жетонов.
+        self.assertEqual(allowed, 60 + 299)
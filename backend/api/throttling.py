@@ -0,0 +1,143 @@
+import math
+
+from django.core.cache import caches
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket с состоянием в отдельном кэше Django throttle.
+
+    Частота scope из DEFAULT_THROTTLE_RATES вида «60/min» задаёт ёмкость
+    корзины (60 запросов подряд) и скорость её пополнения (60 за минуту).
+    Корзина пользователя считается по его id, анонима — по IP.
+
+    В кэше хранится одно число — время в миллисекундах, когда корзина
+    снова станет полной (алгоритм GCRA). Запрос забирает жетон атомарным
+    cache.incr и продлевает ключ через cache.touch: обычная проверка стоит
+    двух обращений к кэшу и не требует блокировок. Ключ живёт, пока
+    корзина не наполнится. Неатомарен только сброс после простоя,
+    см. take_token. Отклонённый запрос возвращает жетон
+    через cache.decr, а время до следующего жетона уходит
+    в заголовок Retry-After.
+    """
+    cache = caches['throttle']
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def applies(self, request, view):
+        return True
+
+    def get_cache_key(self, request, view):
+        if not self.applies(request, view):
+            return None
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_timeout(self, full_at, now):
+        """
+        Ключ нужен, пока корзина не полна: после его вытеснения
+        клиент получает полную корзину, как и без вытеснения.
+        """
+        return math.ceil((full_at - now) / 1000) + 1
+
+    def take_token(self, key, interval, now):
+        try:
+            full_at = self.cache.incr(key, interval)
+        except ValueError:
+            if self.cache.add(key, now + interval,
+                              self.get_timeout(now + interval, now)):
+                return now + interval
+            full_at = self.cache.incr(key, interval)
+        # Корзина успела наполниться: отсчёт начинается заново от now.
+        # Здесь incr не подходит, нужен max(full_at, now), поэтому
+        # значение перезаписывается через set. Жетоны, взятые другими
+        # запросами между incr и set, теряются. Так бывает только
+        # в последнюю секунду жизни ключа после простоя, когда корзина
+        # уже полна, и клиент получает не больше одного лишнего жетона
+        # на каждый параллельный запрос.
+        if full_at - interval < now:
+            full_at = now + interval
+            self.cache.set(key, full_at, self.get_timeout(full_at, now))
+        return full_at
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        interval = math.ceil(self.duration * 1000 / self.num_requests)
+        capacity = interval * self.num_requests
+        now = int(self.timer() * 1000)
+        full_at = self.take_token(self.key, interval, now)
+        if full_at - now <= capacity:
+            # incr не продлевает ключ, а он должен дожить до full_at.
+            self.cache.touch(self.key, self.get_timeout(full_at, now))
+            return True
+        try:
+            self.cache.decr(self.key, interval)
+        except ValueError:
+            pass
+        self.retry_after = (full_at - now - capacity) / 1000
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+class ReadThrottle(TokenBucketThrottle):
+    """
+    Дешёвые читающие запросы.
+    """
+    scope = 'read'
+
+    def applies(self, request, view):
+        return request.method in SAFE_METHODS
+
+
+class WriteThrottle(TokenBucketThrottle):
+    """
+    Изменяющие запросы: избранное, корзина, подписки, рецепты.
+    """
+    scope = 'write'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS
+
+
+class UploadThrottle(TokenBucketThrottle):
+    """
+    Загрузка картинок рецептов: файлом через image/, рецептом
+    в multipart/form-data или base64 в JSON. Файлы распознаются
+    по действию и типу содержимого, без разбора multipart. Тело JSON
+    разбирается, чтобы найти поле image; разобранные данные запрос
+    хранит, и view их не разбирает повторно.
+    """
+    scope = 'upload'
+    recipe_actions = ('create', 'update', 'partial_update')
+
+    def applies(self, request, view):
+        if request.method in SAFE_METHODS:
+            return False
+        action = getattr(view, 'action', None)
+        if action == 'image':
+            return True
+        if action not in self.recipe_actions:
+            return False
+        if request.content_type.startswith('multipart/form-data'):
+            return True
+        return request.content_type.startswith('application/json') and (
+            'image' in request.data
+        )
+
+
+class ExportThrottle(TokenBucketThrottle):
+    """
+    Выгрузка списка покупок.
+    """
+    scope = 'export'
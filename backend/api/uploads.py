@@ -0,0 +1,37 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from rest_framework.exceptions import APIException
+
+
+class ImageTooLarge(APIException):
+    status_code = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер картинки превышает допустимый.'
+    default_code = 'image_too_large'
+
+
+class LimitedFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Загрузка файлов частями сразу во временный файл на диске
+    с ограничением размера RECIPE_IMAGE_MAX_SIZE.
+    Расход памяти не зависит от размера картинки.
+    """
+    chunk_size = 64 * 1024
+
+    def handle_raw_input(self, input_data, meta, content_length, boundary,
+                         encoding=None):
+        if content_length > settings.RECIPE_IMAGE_MAX_SIZE + self.chunk_size:
+            raise ImageTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.file.close()
+            raise ImageTooLarge()
+        return super().receive_data_chunk(raw_data, start)
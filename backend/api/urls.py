@@ -2,7 +2,7 @@ from django.urls import include, path, re_path
 
 from rest_framework.routers import DefaultRouter
 
-from .views import (DownloadShoppingCartViewSet, FavoriteViewSet,
+from .views import (DownloadShoppingCartViewSet, FavoriteViewSet, FeedViewSet,
                     IngredientViewSet, RecipeViewSet, ShoppingCartViewSet,
                     SubscribeViewSet, TagViewSet, UserViewSet)
 
@@ -29,9 +29,10 @@ urlpatterns = [
         r'recipes/(?P<recipe_id>\d+)/shopping_cart/',
         ShoppingCartViewSet.as_view({'post': 'create', 'delete': 'delete'}),
         name='shopping_cart'),
+     path('recipes/feed/',
+          FeedViewSet.as_view({'get': 'list'}), name='feed'),
      path('recipes/download_shopping_cart/',
           DownloadShoppingCartViewSet.as_view(), name='download'),
-     path('', include('djoser.urls')),
      path('', include(router.urls)),
      path('auth/', include('djoser.urls.authtoken')),
 ]
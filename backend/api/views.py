@@ -1,35 +1,51 @@
 from http import HTTPStatus
 
-from django.db import IntegrityError
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+from djoser.views import UserViewSet as DjoserUserViewSet
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, FeedItem, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, Tag)
+from recipes.reference import get_tags
+from recipes.versions import INGREDIENTS, RECIPES, TAGS
 
 from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from users.models import Subscribe, User
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .filters import RecipeFilter
+from .pagination import (CustomPagination, FeedPagination, RecipePagination,
+                         SubscribePagination)
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeCartSerializer, RecipeSerializer,
+from .serializers import (FavoriteSerializer, FeedItemSerializer,
+                          IngredientSerializer, RecipeCartSerializer,
+                          RecipeImageSerializer, RecipeSerializer,
                           RecipeSerializerPost, RecipeShortFieldSerializer,
                           ShoppingCartSerializer, SubscribeSerializer,
-                          TagSerializer, UserSerializer)
-from .mixins import ListRetriveViewSet
+                          TagSerializer)
+from .shopping_list import (EXPORT_FORMATS, cache_stream, get_cart_hash,
+                            get_shopping_list)
+from .throttling import (ExportThrottle, ReadThrottle, UploadThrottle,
+                         WriteThrottle)
+from .uploads import LimitedFileUploadHandler
+from .mixins import ConditionalGetMixin, ListRetriveViewSet, ReplicaReadMixin
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, DjoserUserViewSet):
     """
-    Обработка модели пользователя.
+    Обработка модели пользователя: маршруты и сериализаторы djoser,
+    безопасные запросы читают с реплик.
     """
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
     pagination_class = CustomPagination
 
 
@@ -39,10 +55,15 @@ class SubscribeViewSet(viewsets.ModelViewSet):
     """
     serializer_class = SubscribeSerializer
     permission_classes = (permissions.IsAuthenticated,)
-    pagination_class = CustomPagination
+    pagination_class = SubscribePagination
 
     def get_queryset(self):
-        return Subscribe.objects.filter(user=self.request.user)
+        return (
+            Subscribe.objects
+            .filter(user=self.request.user)
+            .select_related('author')
+            .order_by('-id')
+        )
 
     def create(self, request, *args, **kwargs):
         """
@@ -76,33 +97,91 @@ class SubscribeViewSet(viewsets.ModelViewSet):
         """
         author_id = self.kwargs.get('author_id')
         author = get_object_or_404(User, id=author_id)
-        get_object_or_404(
-            Subscribe,
-            author=author,
-            user=self.request.user
-        ).delete()
+        # Блокировка строки: при параллельных отписках счётчик
+        # подписчиков уменьшается только одним запросом.
+        with transaction.atomic():
+            get_object_or_404(
+                Subscribe.objects.select_for_update(),
+                author=author,
+                user=self.request.user
+            ).delete()
         return Response(status=HTTPStatus.NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+def get_recipe_queryset(user):
+    """
+    Автор, теги и продукты загружаются заранее, а флаги избранного
+    и корзины вычисляются подзапросами в запросе списка рецептов.
+    Поэтому число запросов не зависит от размера страницы.
+    """
+    queryset = Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch(
+            'recipe_ingredient',
+            queryset=IngredientInRecipe.objects.select_related('ingredient')
+        )
+    )
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_favorited=Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        )),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        ))
+    )
+
+
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     """
     Обработка моделей рецептов.
     """
     queryset = Recipe.objects.all()
+    version_names = (RECIPES,)
+    user_versions = True
+    stale_counters = True
     permission_classes = (IsAuthorOrReadOnly, )
+    throttle_classes = (ReadThrottle, WriteThrottle, UploadThrottle)
     serializer_class = RecipeSerializer
     filter_class = RecipeFilter
     filter_backends = (DjangoFilterBackend, )
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        return get_recipe_queryset(self.request.user)
+
+    def initialize_request(self, request, *args, **kwargs):
+        """
+        Файлы из multipart/form-data пишутся на диск частями.
+        """
+        request.upload_handlers = [LimitedFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
     def get_serializer_class(self):
         """
         Функция выбора сериализатора при разных запросах.
         """
+        if self.action == 'image':
+            return RecipeImageSerializer
         if self.request.method == 'GET':
             return RecipeSerializer
         return RecipeSerializerPost
 
+    @action(detail=True, methods=('put',), parser_classes=(MultiPartParser,))
+    def image(self, request, pk=None):
+        """
+        Загрузка картинки рецепта файлом multipart/form-data.
+        """
+        serializer = self.get_serializer(self.get_object(), data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     def perform_create(self, serializer):
         """
         Передаём данные автора при создании рецепта.
@@ -110,16 +189,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
 
-class IngredientViewSet(ListRetriveViewSet):
+class FeedViewSet(ConditionalGetMixin, ListRetriveViewSet):
+    """
+    Лента рецептов авторов, на которых подписан пользователь.
+    Страница читается из таблицы ленты по индексу (user, pub_date),
+    рецепты страницы загружаются одним запросом.
+    """
+    serializer_class = FeedItemSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = FeedPagination
+    version_names = (RECIPES,)
+    user_versions = True
+    stale_counters = True
+
+    def get_queryset(self):
+        user = self.request.user
+        return FeedItem.objects.filter(user=user).prefetch_related(
+            Prefetch('recipe', queryset=get_recipe_queryset(user))
+        ).order_by('-pub_date', '-recipe_id')
+
+
+class IngredientViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                        ListRetriveViewSet):
     """
     Обработка модели продуктов.
     """
     queryset = Ingredient.objects.all()
+    version_names = (INGREDIENTS,)
     permission_classes = [permissions.AllowAny, ]
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend, IngredientFilter)
-    search_fields = ['^name', ]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по началу названия через индекс в памяти, без запросов к базе.
+        """
+        return self.conditional(self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        limit = request.query_params.get('limit', '')
+        limit = (int(limit) if limit.isdigit()
+                 else settings.INGREDIENT_SEARCH_LIMIT)
+        return Response(ingredient_index.search(
+            request.query_params.get('name', ''), limit
+        ))
 
 
 class ShoppingCartViewSet(viewsets.ModelViewSet):
@@ -157,52 +270,98 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         recipe_id = self.kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        Favorite.objects.create(user=self.request.user, recipe=recipe)
+        try:
+            Favorite.objects.create(user=self.request.user, recipe=recipe)
+        except IntegrityError:
+            return Response(
+                'Рецепт уже в избранном',
+                status=HTTPStatus.BAD_REQUEST
+            )
         serializer = RecipeShortFieldSerializer(recipe, many=False)
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
 
     def delete(self, request, *args, **kwargs):
         recipe_id = self.kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        get_object_or_404(
-            Favorite,
-            user=self.request.user,
-            recipe=recipe
-        ).delete()
+        # Блокировка строки: при параллельных удалениях счётчик
+        # избранного уменьшается только одним запросом.
+        with transaction.atomic():
+            get_object_or_404(
+                Favorite.objects.select_for_update(),
+                user=self.request.user,
+                recipe=recipe
+            ).delete()
         return Response(status=HTTPStatus.NO_CONTENT)
 
 
-class TagViewSet(ListRetriveViewSet):
+class TagViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                 ListRetriveViewSet):
     """
     Обработка моделей тегов.
     """
     queryset = Tag.objects.all()
+    version_names = (TAGS,)
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny, )
 
+    def list(self, request, *args, **kwargs):
+        """
+        Теги отдаются из кэша справочников.
+        """
+        return self.conditional(self.get_tags, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(self.get_tag, request, *args, **kwargs)
+
+    def get_tags(self, request, *args, **kwargs):
+        return Response(get_tags())
+
+    def get_tag(self, request, *args, **kwargs):
+        for tag in get_tags():
+            if str(tag['id']) == kwargs[self.lookup_field]:
+                return Response(tag)
+        raise Http404
+
 
 class DownloadShoppingCartViewSet(APIView):
+    """
+    Выгрузка списка покупок в форматах txt, csv и pdf.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (ExportThrottle,)
+
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Параметр format задаёт формат файла, а не рендерер DRF.
+        """
+        return super().perform_content_negotiation(request, force=True)
+
     def get(self, request):
-        user = request.user
-        shopping_carts = ShoppingCart.objects.filter(user=user)
-        recipes = [cart.recipe for cart in shopping_carts]
-        cart_dict = {}
-        for recipe in recipes:
-            for ingredient in recipe.ingredients.all():
-                amount = get_object_or_404(IngredientInRecipe,
-                                           recipe=recipe,
-                                           ingredient=ingredient).amount
-                if ingredient.name not in cart_dict:
-                    cart_dict[ingredient.name] = amount
-                else:
-                    cart_dict[ingredient.name] += amount
-        content = ''
-        for item in cart_dict:
-            measurement_unit = get_object_or_404(Ingredient,
-                                                 name=item).measurement_unit
-            content += f'{item} -- {cart_dict[item]} {measurement_unit}\n'
-        response = HttpResponse(content,
-                                content_type='text/plain,charset=utf8')
-        response['Content-Disposition'] = 'attachment; filename="cart.txt"'
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                f'Неизвестный формат: {export_format}',
+                status=HTTPStatus.BAD_REQUEST
+            )
+        render, content_type = EXPORT_FORMATS[export_format]
+        items = list(get_shopping_list(request.user))
+        etag = f'"{get_cart_hash(items)}-{export_format}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+        cache_key = f'shopping_list:{request.user.id}:{etag}'
+        body = cache.get(cache_key)
+        if body is not None:
+            response = HttpResponse(body, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                cache_stream(render(items), cache_key),
+                content_type=content_type
+            )
+        response['ETag'] = etag
+        response['Content-Disposition'] = (
+            f'attachment; filename="cart.{export_format}"'
+        )
         return response
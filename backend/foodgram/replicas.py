@@ -0,0 +1,85 @@
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'db_sticky:{}'
+
+state = threading.local()
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def use_replicas(enabled):
+    """
+    Включение чтения с реплик для запросов текущего потока.
+    """
+    state.use_replicas = enabled
+
+
+def replicas_in_use():
+    """
+    Запросы текущего потока читают с реплик.
+    """
+    return bool(get_replicas()) and getattr(state, 'use_replicas', False)
+
+
+def is_sticky(user):
+    """
+    Пользователь недавно что-то изменил и должен читать с основной базы,
+    пока реплики не догонят её.
+    """
+    return user.is_authenticated and bool(cache.get(STICKY_KEY.format(user.id)))
+
+
+class ReplicaRouter:
+    """
+    Чтение с реплик из DB_REPLICAS, если оно включено для текущего
+    запроса. Запись и всё, что выполняется внутри транзакции,
+    идут в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if (
+            not replicas
+            or not getattr(state, 'use_replicas', False)
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReadAfterWriteMiddleware:
+    """
+    После изменяющего запроса пользователь на DB_REPLICA_STICKY_SECONDS
+    закрепляется за основной базой, чтобы сразу видеть свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in SAFE_METHODS
+            and user is not None
+            and user.is_authenticated
+            and get_replicas()
+        ):
+            cache.set(STICKY_KEY.format(user.id), True,
+                      settings.DB_REPLICA_STICKY_SECONDS)
+        return response
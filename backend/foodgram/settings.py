@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -46,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.replicas.ReadAfterWriteMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -90,6 +92,34 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: хосты PostgreSQL через запятую, для SQLite — пути
+# к файлам баз.
+DB_REPLICAS = [
+    replica for replica in os.getenv('DB_REPLICAS', default='').split(',')
+    if replica
+]
+
+DB_REPLICA_FIELD = (
+    'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+)
+
+for number, replica in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        DB_REPLICA_FIELD: replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.replicas.ReplicaRouter']
+
+DB_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=5)
+)
+
+COUNTERS_STALE_SECONDS = int(
+    os.getenv('COUNTERS_STALE_SECONDS', default=60)
+)
+
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -130,9 +160,22 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ReadThrottle',
+        'api.throttling.WriteThrottle',
+    ],
+    # Клиентский адрес для лимитов берётся из X-Forwarded-For,
+    # дописанного nginx, а не из заголовка, присланного клиентом.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '600/min',
+        'write': '60/min',
+        'upload': '10/min',
+        'export': '20/hour',
+    },
 }
 
 DJOSER = {
@@ -148,6 +191,69 @@ DJOSER = {
     'HIDE_USERS': False,
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    },
+    # Корзины лимитов запросов хранятся отдельно, чтобы вытеснение
+    # версий, справочников и списков покупок их не сбрасывало.
+    'throttle': {
+        'BACKEND': os.getenv(
+            'THROTTLE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION', default='throttle'),
+    },
+}
+
+if CACHES['throttle']['BACKEND'].endswith('LocMemCache'):
+    CACHES['throttle']['OPTIONS'] = {'MAX_ENTRIES': 100000}
+
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+INGREDIENT_INDEX_TIMEOUT = 60 * 60
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+RECIPE_IMAGE_VARIANTS = {
+    'card': 480,
+    'detail': 960,
+    'retina': 1920,
+}
+
+RECIPE_IMAGE_FORMAT = 'WEBP'
+
+RECIPE_IMAGE_QUALITY = 80
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+FEED_BATCH_SIZE = 1000
+
+FEED_BACKFILL_SIZE = 100
+
+TOKEN_CACHE_SIZE = 10000
+
+TOKEN_CACHE_TIMEOUT = 30
+
+TOKEN_CACHE_SHARED = os.getenv(
+    'TOKEN_CACHE_SHARED', default='False'
+).lower() in ('true', '1')
+
+TOKEN_SHARED_CACHE_TIMEOUT = 5 * 60
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
@@ -156,6 +262,8 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
 STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
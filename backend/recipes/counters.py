@@ -0,0 +1,53 @@
+from django.apps import apps as global_apps
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# Счётчик: (модель, поле, связанная модель, внешний ключ на модель).
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Subscribe', 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарное изменение счётчика одним UPDATE без чтения строки.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def get_actual_count(related_model, foreign_key):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{foreign_key: OuterRef('pk')})
+            .order_by()
+            .values(foreign_key)
+            .annotate(count=Count('pk'))
+            .values('count'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def rebuild_counters(apps=global_apps):
+    """
+    Пересчёт счётчиков, разошедшихся с данными.
+    Возвращает число исправленных строк для каждого счётчика.
+    """
+    fixed = {}
+    for model_name, field, related_model_name, foreign_key in COUNTERS:
+        model = apps.get_model(model_name)
+        actual = get_actual_count(
+            apps.get_model(related_model_name), foreign_key
+        )
+        drifted = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        ).values_list('pk', flat=True)
+        fixed[f'{model._meta.label}.{field}'] = model.objects.filter(
+            pk__in=list(drifted)
+        ).update(**{field: actual})
+    return fixed
@@ -0,0 +1,56 @@
+from itertools import islice
+
+from django.conf import settings
+from users.models import Subscribe
+
+from .models import FeedItem, Recipe
+
+
+def create_in_batches(items):
+    """
+    Запись в ленту пачками по FEED_BATCH_SIZE строк.
+    """
+    items = iter(items)
+    while True:
+        batch = list(islice(items, settings.FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def push_to_followers(recipe):
+    """
+    Добавление нового рецепта в ленты всех подписчиков автора.
+    """
+    followers = Subscribe.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    create_in_batches(
+        FeedItem(user_id=user_id, recipe_id=recipe.pk,
+                 author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill_feed(subscription):
+    """
+    Добавление последних FEED_BACKFILL_SIZE рецептов автора
+    в ленту нового подписчика.
+    """
+    recipes = Recipe.objects.filter(
+        author_id=subscription.author_id
+    ).order_by('-pub_date').values_list('id', 'pub_date')
+    create_in_batches(
+        FeedItem(user_id=subscription.user_id, recipe_id=recipe_id,
+                 author_id=subscription.author_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes[:settings.FEED_BACKFILL_SIZE]
+    )
+
+
+def remove_from_feed(subscription):
+    """
+    Удаление рецептов автора из ленты отписавшегося пользователя.
+    """
+    FeedItem.objects.filter(
+        user_id=subscription.user_id, author_id=subscription.author_id
+    ).delete()
@@ -0,0 +1,254 @@
+import base64
+import binascii
+import io
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+from .versions import RECIPES, bump_versions
+
+logger = logging.getLogger(__name__)
+
+executor = None
+executor_lock = threading.Lock()
+
+# Заголовки картинок, включая EXIF перед размерами JPEG, умещаются
+# в начало файла; длина кратна 4, чтобы часть base64 декодировалась.
+HEADER_SIZE = 64 * 1024
+
+# Поля рецепта, которые меняет schedule_image_processing.
+IMAGE_FIELDS = ('image', 'image_status', 'image_token', 'image_scheduled')
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+}
+
+
+def get_variant_format():
+    """
+    Формат уменьшенных копий: WebP, если Pillow собран с его поддержкой.
+    """
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def get_variant_name(name, variant):
+    """
+    Имя уменьшенной копии рядом с оригиналом: image.png -> image_card.webp.
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}_{variant}.{EXTENSIONS[get_variant_format()]}'
+
+
+def get_variant_names(name):
+    return {
+        variant: get_variant_name(name, variant)
+        for variant in settings.RECIPE_IMAGE_VARIANTS
+    }
+
+
+def render_variant(source, width, image_format):
+    variant = source.copy()
+    variant.thumbnail((width, width * 4), Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, format=image_format,
+                 quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def has_image_variants(image):
+    return all(
+        image.storage.exists(name)
+        for name in get_variant_names(image.name).values()
+    )
+
+
+def save_variant(storage, name, content):
+    """
+    Сохранение копии под именем, производным от оригинала. Хранилище
+    с именами по содержимому сохраняет её через save_as, не меняя имя.
+    """
+    if hasattr(storage, 'save_as'):
+        storage.save_as(name, content)
+        return
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, content)
+
+
+def create_image_variants(image):
+    """
+    Создание уменьшенных копий картинки рецепта во всех размерах
+    из RECIPE_IMAGE_VARIANTS. Существующие копии перезаписываются.
+    """
+    storage = image.storage
+    image_format = get_variant_format()
+    with storage.open(image.name, 'rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    if image_format == 'JPEG' or source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGB')
+    for variant, name in get_variant_names(image.name).items():
+        content = render_variant(
+            source, settings.RECIPE_IMAGE_VARIANTS[variant], image_format
+        )
+        save_variant(storage, name, ContentFile(content))
+
+
+def get_base64_payload(data):
+    if ';base64,' in data:
+        return data.split(';base64,', 1)[1]
+    return data
+
+
+def b64decode(data):
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError('Некорректная строка base64.')
+
+
+def check_image_header(header):
+    """
+    Проверка размеров картинки по заголовку: Pillow читает только его,
+    поэтому «бомба» с огромным разрешением отклоняется без распаковки.
+    Если заголовок не удалось разобрать, решение остаётся
+    за полной проверкой файла.
+    """
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise ValueError('Слишком большое разрешение картинки.')
+    except (OSError, SyntaxError):
+        return
+    if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+        raise ValueError('Слишком большое разрешение картинки.')
+
+
+def check_image_data(data):
+    """
+    Быстрая проверка строки base64 в запросе: размер файла считается
+    по длине строки, разрешение — по заголовку из её начала.
+    """
+    payload = get_base64_payload(data)
+    size = len(payload) * 3 // 4 - payload[-2:].count('=')
+    if size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValueError('Размер картинки превышает допустимый.')
+    check_image_header(b64decode(payload[:HEADER_SIZE]))
+
+
+def decode_image(data):
+    """
+    Декодирование картинки из base64 и проверка её размера и формата.
+    """
+    decoded = b64decode(get_base64_payload(data))
+    if len(decoded) > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValueError('Размер картинки превышает допустимый.')
+    check_image_header(decoded)
+    try:
+        with Image.open(io.BytesIO(decoded)) as image:
+            image.verify()
+            image_format = image.format
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValueError('Файл не является картинкой.')
+    if image_format not in EXTENSIONS:
+        raise ValueError(f'Неподдерживаемый формат: {image_format}.')
+    name = f'{str(uuid.uuid4())[:12]}.{EXTENSIONS[image_format]}'
+    return ContentFile(decoded, name=name)
+
+
+def mark_image_failed(recipes):
+    recipes.update(image_status=Recipe.IMAGE_FAILED)
+    bump_versions(RECIPES)
+
+
+def process_recipe_image(recipe_id, token, data=None):
+    """
+    Обработка картинки рецепта: декодирование и проверка строки base64,
+    если она передана, сохранение файла и создание уменьшенных копий.
+
+    Результат записывается, только если рецепт ещё ждёт эту загрузку:
+    задача более старой картинки, завершившаяся позже новой,
+    ничего не меняет.
+    """
+    recipes = Recipe.objects.filter(
+        pk=recipe_id, image_token=token, image_status=Recipe.IMAGE_PENDING
+    )
+    try:
+        recipe = recipes.get()
+        if data is not None:
+            content = decode_image(data)
+            recipe.image.save(content.name, content, save=False)
+        # Копии картинки, уже загруженной ранее, лежат под тем же именем.
+        if not has_image_variants(recipe.image):
+            create_image_variants(recipe.image)
+    except Recipe.DoesNotExist:
+        return
+    except (ValueError, OSError, Image.DecompressionBombError) as error:
+        logger.warning('Не удалось обработать картинку рецепта %s: %s',
+                       recipe_id, error)
+        mark_image_failed(recipes)
+        return
+    except Exception:
+        # Ошибка в пуле потоков иначе осталась бы в future незамеченной,
+        # а рецепт — в статусе «обрабатывается».
+        logger.exception('Ошибка обработки картинки рецепта %s', recipe_id)
+        mark_image_failed(recipes)
+        return
+    recipes.update(image=recipe.image.name, image_status=Recipe.IMAGE_READY)
+    bump_versions(RECIPES)
+
+
+def run_image_job(recipe_id, token, data=None):
+    try:
+        process_recipe_image(recipe_id, token, data)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return executor
+
+
+def schedule_image_processing(recipe, data=None):
+    """
+    Постановка картинки рецепта в очередь фоновой обработки после
+    фиксации транзакции. Рецепт получает статус «обрабатывается»
+    и новую метку загрузки и должен быть сохранён вызывающим кодом
+    в той же транзакции с полями IMAGE_FIELDS.
+    При RECIPE_IMAGE_WORKERS = 0 обработка выполняется без пула потоков.
+    """
+    recipe.image_status = Recipe.IMAGE_PENDING
+    recipe.image_token = uuid.uuid4().hex
+    recipe.image_scheduled = timezone.now()
+    token = recipe.image_token
+
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            get_executor().submit(run_image_job, recipe.pk, token, data)
+        else:
+            process_recipe_image(recipe.pk, token, data)
+
+    transaction.on_commit(submit)
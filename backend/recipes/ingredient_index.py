@@ -0,0 +1,68 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .reference import get_ingredients
+
+
+class IngredientIndex:
+    """
+    Индекс продуктов в памяти процесса для поиска по началу названия.
+
+    Строится при первом обращении из кэша справочников: отсортированный
+    список названий в нижнем регистре, поиск выполняется бинарным поиском
+    без запросов к базе. Сбрасывается сигналами при изменении продуктов, а также
+    по истечении INGREDIENT_INDEX_TIMEOUT, чтобы изменения из других
+    процессов тоже попадали в индекс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _is_fresh(self, index):
+        timeout = settings.INGREDIENT_INDEX_TIMEOUT
+        return (
+            index is not None
+            and (timeout is None or time.monotonic() - index[2] < timeout)
+        )
+
+    def _build(self):
+        with self._lock:
+            if self._is_fresh(self._index):
+                return self._index
+            ingredients = sorted(
+                (ingredient['name'].lower(), ingredient['id'], ingredient)
+                for ingredient in get_ingredients()
+            )
+            keys = [key for key, _, _ in ingredients]
+            rows = [ingredient for _, _, ingredient in ingredients]
+            self._index = (keys, rows, time.monotonic())
+            return self._index
+
+    def search(self, prefix='', limit=None):
+        """
+        Продукты, название которых начинается с prefix.
+        """
+        index = self._index
+        if not self._is_fresh(index):
+            index = self._build()
+        keys, rows, _ = index
+        prefix = prefix.lower()
+        result = []
+        for position in range(bisect_left(keys, prefix), len(keys)):
+            if limit is not None and len(result) >= limit:
+                break
+            if not keys[position].startswith(prefix):
+                break
+            result.append(rows[position])
+        return result
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+ingredient_index = IngredientIndex()
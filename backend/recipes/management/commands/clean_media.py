@@ -0,0 +1,72 @@
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.images import get_variant_names
+from recipes.models import Recipe
+
+
+def iter_files(storage, path=''):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name) if path else name
+    for directory in directories:
+        yield from iter_files(
+            storage, os.path.join(path, directory) if path else directory
+        )
+
+
+class Command(BaseCommand):
+    help = ('Удаление файлов из MEDIA_ROOT, на которые не ссылается '
+            'ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help='Не удалять файлы моложе указанного числа минут: '
+                 'они могут принадлежать ещё не сохранённым рецептам.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены.',
+        )
+
+    def get_referenced_names(self):
+        referenced = set()
+        images = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        )
+        for name in images.iterator():
+            referenced.add(name)
+            referenced.update(get_variant_names(name).values())
+        return referenced
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('Возраст файла не может быть отрицательным.')
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        referenced = self.get_referenced_names()
+        deleted = 0
+        freed = 0
+        for name in iter_files(default_storage):
+            if name in referenced:
+                continue
+            if default_storage.get_modified_time(name) > threshold:
+                continue
+            size = default_storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+            deleted += 1
+            freed += size
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {deleted}, {freed / 1024:.1f} КБ.'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import create_image_variants, has_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий картинок существующих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        created = 0
+        failed = 0
+        recipes = Recipe.objects.exclude(image='').order_by('id')
+        for recipe in recipes.iterator():
+            if not options['force'] and has_image_variants(recipe.image):
+                continue
+            try:
+                create_image_variants(recipe.image)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{recipe.image.name}: {error}')
+                continue
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы копии для картинок: {created}, ошибок: {failed}.'
+        ))
@@ -1,22 +1,163 @@
+import csv
 import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.reference import invalidate_ingredients
+from recipes.versions import INGREDIENTS, bump_versions
+
+FIELDS = ('name', 'measurement_unit')
+READ_SIZE = 64 * 1024
+
+
+def iter_json(file):
+    """
+    Построчный разбор JSON-массива объектов без чтения файла целиком.
+    Вместе с объектом возвращается его положение в массиве для сообщений
+    об ошибках.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    number = 0
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise CommandError('Ожидается JSON-массив продуктов.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if started and buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise CommandError('Некорректный JSON во входном файле.')
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        number += 1
+        yield f'Элемент {number}', item
+
+
+def iter_jsonl(file):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise CommandError(f'Строка {number}: некорректный JSON.')
+        yield f'Строка {number}', item
+
+
+def iter_csv(file):
+    reader = csv.reader(file)
+    for row in reader:
+        if not row or tuple(row[:2]) == FIELDS:
+            continue
+        yield f'Строка {reader.line_num}', dict(zip(FIELDS, row))
+
+
+def make_ingredient(position, item):
+    """
+    Продукт из записи файла. Запись без нужных полей, с пустыми
+    или слишком длинными значениями останавливает загрузку с указанием
+    её места в файле.
+    """
+    if not isinstance(item, dict):
+        raise CommandError(f'{position}: ожидается объект с полями '
+                           f'{", ".join(FIELDS)}.')
+    values = {}
+    for field in FIELDS:
+        value = item.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise CommandError(f'{position}: не заполнено поле {field}.')
+        value = value.strip()
+        max_length = Ingredient._meta.get_field(field).max_length
+        if len(value) > max_length:
+            raise CommandError(f'{position}: поле {field} длиннее '
+                               f'{max_length} символов.')
+        values[field] = value
+    return Ingredient(**values)
+
+
+READERS = {
+    'json': iter_json,
+    'jsonl': iter_jsonl,
+    'csv': iter_csv,
+}
 
 
 class Command(BaseCommand):
+    help = 'Загрузка продуктов из файла JSON, JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.json'),
+            help='Путь к файлу с продуктами.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество продуктов в одном INSERT.',
+        )
+
     def handle(self, *args, **options):
-        ingredients_file = open(
-            'data/ingredients.json',
-            encoding='utf-8'
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
         )
-        ingredients_str = ingredients_file.read()
-        ingredients_data = json.loads(ingredients_str)
-        for ingredient in ingredients_data:
-            name = ingredient['name']
-            measurement_unit = ingredient['measurement_unit']
-            Ingredient.objects.create(
-                name=name,
-                measurement_unit=measurement_unit
-            )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть больше 0.')
+        started = time.monotonic()
+        processed = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            with transaction.atomic():
+                count_before = Ingredient.objects.count()
+                ingredients = (
+                    make_ingredient(position, item)
+                    for position, item in READERS[file_format](file)
+                )
+                while True:
+                    batch = list(islice(ingredients, batch_size))
+                    if not batch:
+                        break
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+                    processed += len(batch)
+                created = Ingredient.objects.count() - count_before
+                # bulk_create не вызывает сигналов.
+                bump_versions(INGREDIENTS)
+                transaction.on_commit(invalidate_ingredients)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено: {created}, '
+            f'{processed / elapsed if elapsed else processed:.0f} строк/с.'
+        ))
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.images import mark_image_failed, process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Завершение обработки картинок, потерянной при перезапуске '
+            'процессов: сохранённые файлы обрабатываются заново, '
+            'рецепты без файла получают статус «ошибка обработки».')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=30,
+            help='Не трогать картинки, поставленные в обработку менее '
+                 'указанного числа минут назад: их задачи ещё могут '
+                 'выполняться.',
+        )
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('Возраст задачи не может быть отрицательным.')
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        stale = Recipe.objects.filter(
+            Q(image_scheduled__isnull=True) | Q(image_scheduled__lt=threshold),
+            image_status=Recipe.IMAGE_PENDING,
+        )
+        ids = []
+        for recipe in stale.order_by('id').iterator():
+            ids.append(recipe.pk)
+            # Строка base64 хранилась только в памяти процесса, поэтому
+            # заново обрабатывается лишь уже сохранённый файл.
+            if recipe.image:
+                process_recipe_image(recipe.pk, recipe.image_token)
+            else:
+                mark_image_failed(Recipe.objects.filter(
+                    pk=recipe.pk, image_token=recipe.image_token,
+                    image_status=Recipe.IMAGE_PENDING,
+                ))
+        recovered = Recipe.objects.filter(
+            pk__in=ids, image_status=Recipe.IMAGE_READY
+        ).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {recovered}, '
+            f'с ошибкой: {len(ids) - recovered}.'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'Обрабатывается'), ('ready', 'Готова'), ('failed', 'Ошибка обработки')], default='ready', max_length=10, verbose_name='Статус картинки'),
+        ),
+    ]
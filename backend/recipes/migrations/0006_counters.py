@@ -0,0 +1,25 @@
+# Generated by Django 2.2.19 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    from recipes.counters import rebuild_counters
+    rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_status'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
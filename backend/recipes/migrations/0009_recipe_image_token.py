@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_token',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Метка загрузки картинки'),
+        ),
+    ]
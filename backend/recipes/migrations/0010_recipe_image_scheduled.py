@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_scheduled',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Время постановки картинки в обработку'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator
 from users.models import User
@@ -44,6 +45,14 @@ class Ingredient(models.Model):
 
     class Meta:
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(fields=('name', 'measurement_unit'),
+                                    name='unique_ingredient')
+        ]
+        indexes = [
+            models.Index(fields=('name',), name='ingredient_name_idx',
+                         opclasses=('varchar_pattern_ops',)),
+        ]
 
     def __str__(self):
         return self.name[:15]
@@ -53,6 +62,14 @@ class Recipe(models.Model):
     """
     Модель рецептов.
     """
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готова'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    )
 
     author = models.ForeignKey(
         User,
@@ -65,6 +82,23 @@ class Recipe(models.Model):
         max_length=200,
     )
     image = models.ImageField('Картинка',)
+    image_status = models.CharField(
+        'Статус картинки',
+        max_length=10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+    )
+    image_token = models.CharField(
+        'Метка загрузки картинки',
+        max_length=32,
+        blank=True,
+        editable=False,
+    )
+    image_scheduled = models.DateTimeField(
+        'Время постановки картинки в обработку',
+        null=True,
+        editable=False,
+    )
     text = models.TextField('Описание',)
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -85,10 +119,26 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name[:15]
@@ -116,6 +166,10 @@ class IngredientInRecipe(models.Model):
 
     class Meta:
         verbose_name = 'Продукты в рецепте'
+        indexes = [
+            models.Index(fields=('recipe', 'ingredient'),
+                         name='ingredient_in_recipe_idx'),
+        ]
 
     def __str__(self):
         return f'{self.ingredient} {self.recipe}'
@@ -192,6 +246,54 @@ class TagRecipe(models.Model):
 
     class Meta:
         verbose_name = 'Теги рецепта'
+        indexes = [
+            models.Index(fields=('tag', 'recipe'), name='tag_recipe_idx'),
+        ]
 
     def __str__(self):
         return f'{self.tag} {self.recipe}'
+
+
+class FeedItem(models.Model):
+    """
+    Модель ленты: рецепты авторов, на которых подписан пользователь.
+    Автор и дата публикации копируются из рецепта, чтобы страница ленты
+    читалась по индексу без соединения с рецептами.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Читатель',
+        related_name='feed',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_items',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента'
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_feed_item')
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Ingredient, Tag
+
+TAGS_KEY = 'reference:tags'
+TAG_SLUGS_KEY = 'reference:tag_slugs'
+INGREDIENTS_KEY = 'reference:ingredients'
+
+
+def get_cached(key, load):
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        cache.set(key, value, settings.REFERENCE_CACHE_TIMEOUT)
+    return value
+
+
+def get_tags():
+    """
+    Список тегов в виде ответа API.
+    """
+    return get_cached(TAGS_KEY, lambda: list(
+        Tag.objects.order_by('id').values('id', 'name', 'color', 'slug')
+    ))
+
+
+def get_tag_slugs():
+    """
+    Словарь slug -> id тегов.
+    """
+    return get_cached(TAG_SLUGS_KEY, lambda: dict(
+        Tag.objects.values_list('slug', 'id')
+    ))
+
+
+def get_ingredients():
+    """
+    Список продуктов в виде ответа API.
+    """
+    return get_cached(INGREDIENTS_KEY, lambda: list(
+        Ingredient.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit'
+        )
+    ))
+
+
+def invalidate_tags():
+    cache.delete_many((TAGS_KEY, TAG_SLUGS_KEY))
+
+
+def invalidate_ingredients():
+    cache.delete(INGREDIENTS_KEY)
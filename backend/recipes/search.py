@@ -0,0 +1,104 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, When
+
+SEARCH_CONFIG = 'russian'
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+
+
+def get_search_vector():
+    """
+    Поисковый вектор рецепта: название важнее описания.
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def get_fts_query(text):
+    """
+    Запрос FTS5 из пользовательской строки: каждое слово
+    экранируется и ищется по началу.
+    """
+    words = text.replace('"', ' ').split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def update_search_index(recipe):
+    """
+    Обновление поискового индекса рецепта после сохранения.
+    """
+    connection = connections[recipe._state.db or 'default']
+    if connection.vendor == 'postgresql':
+        type(recipe).objects.using(connection.alias).filter(
+            pk=recipe.pk
+        ).update(search_vector=get_search_vector())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s',
+                (recipe.pk,)
+            )
+            cursor.execute(
+                f'INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)',
+                (recipe.pk, recipe.name, recipe.text)
+            )
+
+
+def delete_search_index(recipe):
+    """
+    Удаление рецепта из индекса FTS5.
+    В PostgreSQL вектор хранится в строке рецепта и удаляется с ней.
+    """
+    connection = connections[recipe._state.db or 'default']
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = %s',
+                (recipe.pk,)
+            )
+
+
+def search_recipes(queryset, text):
+    """
+    Полнотекстовый поиск рецептов с сортировкой по релевантности.
+
+    В PostgreSQL используются GIN-индексы по search_vector и триграммам
+    названия, что находит и слова с опечатками. В SQLite поиск идёт
+    по таблице FTS5 с ранжированием bm25.
+    """
+    text = text.strip()
+    if not text:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', text),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=text)
+        ).order_by('-rank', '-similarity', '-pub_date')
+    if connection.vendor == 'sqlite':
+        fts_query = get_fts_query(text)
+        if not fts_query:
+            return queryset
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SQLITE_FTS_TABLE} '
+                f'WHERE {SQLITE_FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({SQLITE_FTS_TABLE}, 10.0, 1.0)',
+                (fts_query,)
+            )
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+        return queryset.filter(pk__in=recipe_ids).order_by(Case(
+            *(When(pk=pk, then=position)
+              for position, pk in enumerate(recipe_ids)),
+            output_field=IntegerField(),
+        ))
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    )
@@ -0,0 +1,139 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import Subscribe, User
+
+from .counters import change_counter
+from .feed import backfill_feed, push_to_followers, remove_from_feed
+from .ingredient_index import ingredient_index
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, Tag, TagRecipe)
+from .reference import invalidate_ingredients, invalidate_tags
+from .search import delete_search_index, update_search_index
+from .versions import (INGREDIENTS, RECIPES, TAGS, bump_versions,
+                       get_user_version_name)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_ingredients(**kwargs):
+    """
+    Сброс кэша и индекса продуктов после фиксации их изменения.
+    """
+    def invalidate():
+        invalidate_ingredients()
+        ingredient_index.invalidate()
+
+    transaction.on_commit(invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def reset_tags(**kwargs):
+    """
+    Сброс кэша тегов после фиксации их изменения.
+    """
+    transaction.on_commit(invalidate_tags)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_index(instance, **kwargs):
+    """
+    Обновление поискового индекса при сохранении рецепта.
+    """
+    update_search_index(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search_index(instance, **kwargs):
+    """
+    Удаление рецепта из поискового индекса.
+    """
+    delete_search_index(instance)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+def bump_recipes_version(**kwargs):
+    """
+    Смена версии рецептов для условных GET-запросов.
+    """
+    bump_versions(RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    bump_versions(TAGS, RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    bump_versions(INGREDIENTS, RECIPES)
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_authors_version(update_fields=None, **kwargs):
+    """
+    Данные автора входят в ответ рецепта. Обновление времени входа
+    на ответ не влияет.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_versions(RECIPES)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Subscribe)
+def bump_user_version(instance, **kwargs):
+    """
+    Смена версии избранного, корзины и подписок пользователя.
+    Счётчики в ответе рецептов версию рецептов не меняют,
+    см. ConditionalGetMixin.stale_counters.
+    """
+    bump_versions(get_user_version_name(instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def push_recipe_to_feed(instance, created, **kwargs):
+    """
+    Новый рецепт попадает в ленты подписчиков автора.
+    """
+    if created:
+        push_to_followers(instance)
+
+
+@receiver(post_save, sender=Subscribe)
+def fill_subscriber_feed(instance, created, **kwargs):
+    if created:
+        backfill_feed(instance)
+
+
+@receiver(post_delete, sender=Subscribe)
+def clear_subscriber_feed(instance, **kwargs):
+    remove_from_feed(instance)
+
+
+def count_on_change(model, field, foreign_key):
+    """
+    Приёмник post_save/post_delete, меняющий счётчик field
+    у объекта model, на который ссылается foreign_key.
+    """
+    def receiver(signal, instance, created=False, **kwargs):
+        if signal is post_save and not created:
+            return
+        change_counter(
+            model, getattr(instance, f'{foreign_key}_id'), field,
+            1 if created else -1
+        )
+    return receiver
+
+
+COUNTER_RECEIVERS = (
+    (Favorite, count_on_change(Recipe, 'favorites_count', 'recipe')),
+    (Recipe, count_on_change(User, 'recipes_count', 'author')),
+    (Subscribe, count_on_change(User, 'followers_count', 'author')),
+)
+
+for sender, counter_receiver in COUNTER_RECEIVERS:
+    post_save.connect(counter_receiver, sender=sender, weak=False)
+    post_delete.connect(counter_receiver, sender=sender, weak=False)
@@ -0,0 +1,63 @@
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с именами по содержимому: файл сохраняется
+    как ab/cd/abcd...ef.png, где имя — SHA-256 содержимого.
+
+    Одинаковые загрузки получают одно имя, и повторно файл не пишется.
+    Содержимое файла по такому имени не меняется, поэтому его можно
+    кэшировать навсегда. Производные файлы (уменьшенные копии)
+    сохраняются под заданным именем через save_as и перезаписываются
+    при смене настроек, поэтому навсегда не кэшируются.
+    """
+    hash_chunk_size = 64 * 1024
+
+    def get_content_hash(self, content):
+        content.seek(0)
+        digest = hashlib.sha256()
+        for chunk in content.chunks(self.hash_chunk_size):
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def get_hashed_name(self, name, content):
+        if HASH_NAME.match(name):
+            return name
+        content_hash = self.get_content_hash(content)
+        extension = os.path.splitext(name)[1].lower()
+        return (f'{content_hash[:2]}/{content_hash[2:4]}/'
+                f'{content_hash}{extension}')
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Повторно использованный файл считается свежим: clean_media
+            # с --min-age не удалит его до сохранения ссылки на него.
+            os.utime(self.path(name))
+            return name
+        return self.save_as(name, content)
+
+    def save_as(self, name, content):
+        """
+        Сохранение файла под заданным именем с заменой существующего.
+        """
+        # Файл пишется под временным именем и атомарно переименовывается,
+        # чтобы параллельная загрузка того же файла не получила ошибку.
+        temp_name = super()._save(
+            os.path.join(os.path.dirname(name), f'.{uuid.uuid4().hex}.tmp'),
+            content
+        )
+        os.replace(self.path(temp_name), self.path(name))
+        return name
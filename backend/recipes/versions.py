@@ -0,0 +1,53 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+
+VERSION_KEY = 'data_version:{}'
+
+
+def get_user_version_name(user_id):
+    """
+    Версия данных, зависящих от пользователя: избранного, корзины
+    и подписок.
+    """
+    return f'user:{user_id}'
+
+
+def new_version():
+    return uuid.uuid4().hex, time.time()
+
+
+def get_versions(*names):
+    """
+    Текущие версии данных: пары (метка, время изменения).
+
+    Версия, которой нет в кэше, создаётся заново. Так после вытеснения
+    ключа клиент получит новый ETag, а не устаревший ответ 304.
+    """
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), timeout=None)
+            versions[key] = cache.get(key) or new_version()
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    """
+    Смена версий данных после фиксации транзакции, чтобы новый ETag
+    не достался ответу, собранному из ещё не изменённых данных.
+    """
+    def bump():
+        cache.set_many(
+            {VERSION_KEY.format(name): new_version() for name in names},
+            timeout=None
+        )
+
+    transaction.on_commit(bump)
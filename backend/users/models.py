@@ -51,6 +51,16 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name='Права доступа',
         default=False
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False,
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password',)
 